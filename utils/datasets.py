@@ -1,111 +1,278 @@
+import json
 import os
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Optional
 
 project_dir = Path(__file__).parent.parent
 
+# Data folders, joined once at import instead of on every call
+_YOGA_DIR = project_dir / "data" / "yoga"
+_INTEL_DIR = project_dir / "data" / "intel"
+_FRUITS_DIR = project_dir / "data" / "fruits"
 
-def get_yoga_dataset() -> Dict[str, List[Path]]:
+# Sidecar file caching the per-class file listings, written next to the class folders
+_CACHE_NAME = ".class_map.json"
+
+
+def _scan_ext(root: Path, ext: str, recursive: bool = False) -> List[str]:
+    """Collect all files with the given extension under root using os.scandir
+
+    Faster than Path.glob because scandir exposes the cached dirent type,
+    so we skip a stat call per file. Paths are kept as plain strings:
+    everything downstream just hands them to Image.open, and a str is one
+    allocation per file where a Path is half a dozen.
+
+    Parameters
+    ----------
+    root
+        Folder to search
+    ext
+        File extension without the dot, e.g. "jpg"
+    recursive
+        Also descend into subfolders, default False
+
+    Returns
+    -------
+    files
+        A list of the matching file paths
+
+    """
+    suffix = f".{ext}"
+    files = []
+    stack = [str(root)]
+    while stack:
+        folder = stack.pop()
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.name.endswith(suffix) and entry.is_file(follow_symlinks=False):
+                    # inode() reuses the dirent, so ordering by it is free and
+                    # lets the disk read the files roughly in physical order
+                    files.append((entry.inode(), entry.path))
+                elif recursive and entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+    files.sort()
+    return [path for _, path in files]
+
+
+def _download_dataset(data_dir: Path, kaggle_dataset: str, hf_mirror: Optional[str] = None, **kaggle_kwargs) -> None:
+    """Download a dataset into data_dir
+
+    If a Hugging Face Hub mirror is given it is preferred:
+    snapshot_download pulls the whole repo through the CDN with parallel
+    chunked requests and doesn't hit Kaggle's API rate limits. Otherwise
+    falls back to the Kaggle API, which needs your API keys set up.
+
+    Parameters
+    ----------
+    data_dir
+        Folder to download into
+    kaggle_dataset
+        The kaggle dataset identifier, e.g. "moltean/fruits"
+    hf_mirror
+        Optional Hugging Face dataset repo id mirroring the same files
+    kaggle_kwargs
+        Extra keyword arguments for dataset_download_files, e.g. force
+
+    """
+    if hf_mirror is not None:
+        from huggingface_hub import snapshot_download
+
+        snapshot_download(repo_id=hf_mirror, repo_type="dataset", local_dir=data_dir, max_workers=8)
+        return
+    try:
+        from kaggle import KaggleApi
+
+        api = KaggleApi()
+        api.authenticate()
+    except OSError as e:
+        print(f"You need to setup up your kaggle api keys.")
+        raise e
+    api.dataset_download_files(kaggle_dataset, path=data_dir, quiet=False, unzip=True, **kaggle_kwargs)
+
+
+def _load_class_map_cache(root: Path, classes: List[str]) -> Optional[Dict[str, List[str]]]:
+    """Load a cached class map from the sidecar file if it is still valid
+
+    The cache is valid if it covers exactly the requested classes and the
+    recorded mtime of every class folder is unchanged, which costs one stat
+    per class instead of a walk per class. Delete the sidecar to invalidate.
+
+    Parameters
+    ----------
+    root
+        Folder containing one subfolder per class
+    classes
+        The class folder names the cache must cover
+
+    Returns
+    -------
+    class_map
+        The cached class map, or None if there is no usable cache
+
+    """
+    cache_file = root / _CACHE_NAME
+    if not cache_file.exists():
+        return None
+    try:
+        cached = json.loads(cache_file.read_text())
+    except (OSError, json.JSONDecodeError):
+        return None
+    mtimes = cached.get("mtime_ns", {})
+    files = cached.get("files", {})
+    if set(mtimes) != set(classes) or set(files) != set(classes):
+        return None
+    for c in classes:
+        if os.stat(root / c).st_mtime_ns != mtimes[c]:
+            return None
+    return {c: files[c] for c in classes}
+
+
+def _save_class_map_cache(root: Path, class_map: Dict[str, List[str]]) -> None:
+    """Write the class map and the class folder mtimes to the sidecar file"""
+    cached = {
+        "mtime_ns": {c: os.stat(root / c).st_mtime_ns for c in class_map},
+        "files": class_map,
+    }
+    (root / _CACHE_NAME).write_text(json.dumps(cached))
+
+
+def _build_class_map(root: Path, classes: List[str], ext: str, recursive: bool = False) -> Dict[str, List[str]]:
+    """Enumerate the image files for each class folder under root
+
+    The class folders are walked concurrently: the enumeration is pure
+    metadata I/O (scandir/stat release the GIL), so threads overlap the
+    per-class syscall latency instead of paying it sequentially.
+
+    Parameters
+    ----------
+    root
+        Folder containing one subfolder per class
+    classes
+        The class folder names, in the order the map should be built
+    ext
+        File extension without the dot, e.g. "jpg"
+    recursive
+        Also descend into subfolders, default False
+
+    Returns
+    -------
+    class_map
+        A dictionary mapping class name to a list of class image paths
+
+    """
+    for c in classes:
+        if not (root / c).exists():
+            raise ValueError(f"Oops. Something went wrong. Missing class {c}")
+    # Datasets are immutable once downloaded, so reuse the cached listing if it is still fresh
+    class_map = _load_class_map_cache(root, classes)
+    if class_map is not None:
+        print(f"Using cached file listing from {root / _CACHE_NAME}.")
+        for c, cls_files in class_map.items():
+            print(f"Got {len(cls_files)} files for class {c}.")
+        return class_map
+    class_map = {}
+    with ThreadPoolExecutor(max_workers=min(16, len(classes))) as executor:
+        for c, cls_files in zip(classes, executor.map(lambda c: _scan_ext(root / c, ext, recursive), classes)):
+            print(f"Got {len(cls_files)} files for class {c}.")
+            class_map[c] = cls_files
+    _save_class_map_cache(root, class_map)
+    return class_map
+
+
+def get_yoga_dataset(hf_mirror: Optional[str] = None) -> Dict[str, List[str]]:
     """Load the yoga pose dataset from kaggle
 
     https://www.kaggle.com/datasets/ujjwalchowdhury/yoga-pose-classification
 
+    Parameters
+    ----------
+    hf_mirror
+        Optional Hugging Face dataset repo mirroring the kaggle dataset,
+        downloads via the hub instead of the kaggle API
+
     Returns
     -------
     class_map
         A dictionary mapping class name to a list of class image paths
 
     """
-    data_dir = project_dir / "data" / "yoga"
+    data_dir = _YOGA_DIR
     classes = ["Downdog", "Warrior2", "Tree", "Plank", "Goddess"]
     extension = "jpg"
 
     print(f"Checking for yoga data in {data_dir}.")
-    # Download the kaggle dataset
     if not data_dir.exists():
-        try:
-            from kaggle import KaggleApi
-
-            api = KaggleApi()
-            api.authenticate()
-        except OSError as e:
-            print(f"You need to setup up your kaggle api keys.")
-            raise e
-        api.dataset_download_files("ujjwalchowdhury/yoga-pose-classification", path=data_dir, quiet=False, unzip=True)
+        _download_dataset(data_dir, "ujjwalchowdhury/yoga-pose-classification", hf_mirror)
     # Move the class folders out of the downloaded folder and delete
     download_dir = data_dir / "YogaPoses"
     if download_dir.exists():
         for folder in [f for f in download_dir.glob("*") if f.is_dir()]:
-            shutil.move(folder, data_dir / folder.name)
+            # Same filesystem, so a plain rename beats shutil.move's copy fallback machinery
+            os.replace(folder, data_dir / folder.name)
         shutil.rmtree(download_dir, ignore_errors=True)
     # Check the data and build our class map
-    class_map = {}
-    for c in classes:
-        if not (data_dir / c).exists():
-            raise ValueError(f"Oops. Something went wrong. Missing class {c}")
-        cls_files = list((data_dir / c).glob(f"*.{extension}"))
-        print(f"Got {len(cls_files)} files for class {c}.")
-        class_map[c] = cls_files
+    class_map = _build_class_map(data_dir, classes, extension)
 
     return class_map
 
 
-def get_intel_scene_dataset(split: str = "train") -> Dict[str, List[Path]]:
+def get_intel_scene_dataset(split: str = "train", hf_mirror: Optional[str] = None) -> Dict[str, List[str]]:
     """Load the Intel scene dataset from kaggle
 
     https://www.kaggle.com/datasets/puneet6060/intel-image-classification
     Originally from a intel sponsored hackathon on https://datahack.analyticsvidhya.com/
 
+    Parameters
+    ----------
+    split
+        Which split to load, default train
+    hf_mirror
+        Optional Hugging Face dataset repo mirroring the kaggle dataset,
+        downloads via the hub instead of the kaggle API
+
     Returns
     -------
     class_map
         A dictionary mapping class name to a list of class image paths
 
     """
-    data_dir = project_dir / "data" / "intel"
+    data_dir = _INTEL_DIR
     classes = ["buildings", "sea", "street", "mountain", "glacier", "forest"]
     extension = "jpg"
 
     print(f"Checking for scene data in {data_dir}.")
-    # Download the kaggle dataset
     if not data_dir.exists():
-        try:
-            from kaggle import KaggleApi
-
-            api = KaggleApi()
-            api.authenticate()
-        except OSError as e:
-            print(f"You need to setup up your kaggle api keys.")
-            raise e
-        api.dataset_download_files("puneet6060/intel-image-classification", path=data_dir, quiet=False, unzip=True)
+        _download_dataset(data_dir, "puneet6060/intel-image-classification", hf_mirror)
     # Check the data and build our class map
-    class_map = {}
     folder = f"seg_{split}"
     split_folder = data_dir / folder / folder
-    for c in classes:
-        class_folder = split_folder / c
-        if not class_folder.exists():
-            raise ValueError(f"Oops. Something went wrong. Missing class {c}")
-        cls_files = list(class_folder.glob(f"*.{extension}"))
-        print(f"Got {len(cls_files)} files for class {c}.")
-        class_map[c] = cls_files
+    class_map = _build_class_map(split_folder, classes, extension)
 
     return class_map
 
 
-def get_fruits_dataset(split: str = "train") -> Dict[str, List[Path]]:
+def get_fruits_dataset(split: str = "train", hf_mirror: Optional[str] = None) -> Dict[str, List[str]]:
     """Load the fruits dataset from kaggle
 
     https://www.kaggle.com/datasets/moltean/fruits
 
+    Parameters
+    ----------
+    split
+        Which split to load, default train
+    hf_mirror
+        Optional Hugging Face dataset repo mirroring the kaggle dataset,
+        downloads via the hub instead of the kaggle API
+
     Returns
     -------
     class_map
         A dictionary mapping class name to a list of class image paths
 
     """
-    data_dir = project_dir / "data" / "fruits"
+    data_dir = _FRUITS_DIR
     classes = [
         "cucumber",
         "zucchini",
@@ -129,35 +296,27 @@ def get_fruits_dataset(split: str = "train") -> Dict[str, List[Path]]:
     extension = "jpg"
 
     print(f"Checking for scene data in {data_dir}.")
-    # Download the kaggle dataset
     if not data_dir.exists():
-        try:
-            from kaggle import KaggleApi
-
-            api = KaggleApi()
-            api.authenticate()
-        except OSError as e:
-            print(f"You need to setup up your kaggle api keys.")
-            raise e
-        api.dataset_download_files("moltean/fruits", path=data_dir, quiet=False, unzip=True, force=True)
-        # Merge fruits and clean up structure
-        fruit_root_folder = data_dir / "fruits-360-original-size" / "fruits-360-original-size"
+        _download_dataset(data_dir, "moltean/fruits", hf_mirror, force=True)
+    # Merge fruits and clean up structure
+    fruit_root_folder = data_dir / "fruits-360-original-size" / "fruits-360-original-size"
+    if fruit_root_folder.exists():
+        moves = []
         for folder in ["Training", "Validation", "Test"]:
             for sub_folder in (fruit_root_folder / folder).glob("*"):
                 cls = "_".join(sub_folder.stem.split("_")[:-1])
                 print(f"Moving {sub_folder.stem} to {cls}")
-                os.makedirs(data_dir / folder.lower() / cls, exist_ok=True)
-                shutil.move(sub_folder, data_dir / folder.lower() / cls / sub_folder.stem)
+                moves.append((sub_folder, data_dir / folder.lower() / cls / sub_folder.stem))
+        # Many subfolders share a class folder, so create each parent only once
+        for parent in {dst.parent for _, dst in moves}:
+            os.makedirs(parent, exist_ok=True)
+        # Renames are single syscalls that release the GIL, so run them concurrently
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            for _ in executor.map(lambda move: os.replace(*move), moves):
+                pass
     # Check the data and build our class map
-    class_map = {}
     split_folder = data_dir / split
-    for c in sorted(classes):
-        class_folder = split_folder / c
-        if not class_folder.exists():
-            raise ValueError(f"Oops. Something went wrong. Missing class {c}")
-        # Need to recursive search now because we have subfolders
-        cls_files = list(class_folder.glob(f"**/*.{extension}"))
-        print(f"Got {len(cls_files)} files for class {c}.")
-        class_map[c] = cls_files
+    # Need to recursive search now because we have subfolders
+    class_map = _build_class_map(split_folder, sorted(classes), extension, recursive=True)
 
     return class_map
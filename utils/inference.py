@@ -1,19 +1,170 @@
-from pathlib import Path
+import io
+import os
 from typing import List, Dict, Tuple
 
 import numpy as np
 import torch
 from PIL import Image
+from torch.utils.data import DataLoader, Dataset
+from torchvision import transforms
 from transformers import CLIPModel, CLIPProcessor
 
 
+def _build_transform(processor: CLIPProcessor) -> transforms.Compose:
+    """Torchvision transform matching the processor's image pipeline
+
+    The CLIPProcessor preprocesses one PIL image at a time through a slow
+    Python path; the equivalent resize/crop/normalize as torchvision
+    transforms is noticeably faster in the DataLoader workers. The sizes
+    and normalization constants come from the processor config, so the
+    output matches what the processor would produce.
+
+    Parameters
+    ----------
+    processor
+        The CLIPProcessor to mirror
+
+    Returns
+    -------
+    transform
+        A transform mapping a PIL image to a [3, H, W] pixel value tensor
+
+    """
+    image_processor = getattr(processor, "image_processor", None) or processor.feature_extractor
+    size = image_processor.size
+    if isinstance(size, dict):
+        size = size.get("shortest_edge") or size["height"]
+    crop_size = image_processor.crop_size
+    if isinstance(crop_size, dict):
+        crop_size = crop_size["height"]
+    return transforms.Compose(
+        [
+            transforms.Resize(size, interpolation=transforms.InterpolationMode.BICUBIC),
+            transforms.CenterCrop(crop_size),
+            transforms.ToTensor(),
+            transforms.Normalize(mean=image_processor.image_mean, std=image_processor.image_std),
+        ]
+    )
+
+
+class ClassImageDataset(Dataset):
+    """Dataset over a single class's image files, yielding preprocessed pixel tensors
+
+    Decoding and preprocessing happen in DataLoader workers so they overlap
+    with inference on the main thread instead of serializing with it.
+
+    Parameters
+    ----------
+    files
+        The image paths for the class
+    transform
+        Preprocessing transform mapping a PIL image to a pixel value tensor
+
+    """
+
+    def __init__(self, files: List[str], transform: transforms.Compose):
+        self.files = files
+        self.transform = transform
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def __getitem__(self, idx: int) -> torch.Tensor:
+        # Slurp the file in one sequential read and decode from memory, rather
+        # than letting PIL issue many small reads against the file handle; the
+        # worker pool keeps several of these reads in flight at once
+        with open(self.files[idx], "rb") as f:
+            image = Image.open(io.BytesIO(f.read()))
+        # The processor resizes to 224 anyway, so let libjpeg decode at reduced
+        # resolution straight from the DCT coefficients; no-op for non-JPEGs
+        image.draft("RGB", (256, 256))
+        return self.transform(image.convert("RGB"))
+
+
+def _make_loader(files: List[str], processor: CLIPProcessor, batch_size: int) -> DataLoader:
+    """Build a DataLoader that decodes images in background workers
+
+    Pinned memory plus non_blocking copies lets the H2D transfer of one
+    batch overlap with decoding of the next.
+
+    Parameters
+    ----------
+    files
+        The image paths to load
+    processor
+        The CLIPProcessor used to preprocess each image
+    batch_size
+        Number of images per yielded batch
+
+    Returns
+    -------
+    loader
+        A DataLoader yielding [batch_size, 3, H, W] pixel value tensors
+
+    """
+    dataset = ClassImageDataset(files, _build_transform(processor))
+    return DataLoader(
+        dataset,
+        batch_size=batch_size,
+        num_workers=min(8, os.cpu_count()),
+        pin_memory=True,
+        prefetch_factor=4,
+        collate_fn=torch.stack,
+    )
+
+
+def _cuda_prefetch(loader: DataLoader, device: str):
+    """Iterate a loader with the next batch's H2D copy overlapped with compute
+
+    Issues each copy on a dedicated CUDA stream and hands the previous batch
+    to the caller once its copy event is waited on, so the PCIe transfer of
+    batch N+1 runs while the model computes on batch N. On non-cuda devices
+    this is just a plain copy loop.
+
+    Parameters
+    ----------
+    loader
+        A DataLoader yielding pinned CPU batches
+    device
+        Inference device the batches are copied to
+
+    Yields
+    ------
+    batch
+        The batch on the target device
+
+    """
+    if not device.startswith("cuda"):
+        for batch in loader:
+            yield batch.to(device)
+        return
+    copy_stream = torch.cuda.Stream()
+    prev_batch = None
+    prev_event = None
+    for batch in loader:
+        with torch.cuda.stream(copy_stream):
+            batch_gpu = batch.to(device, non_blocking=True)
+        event = copy_stream.record_event()
+        if prev_batch is not None:
+            torch.cuda.current_stream().wait_event(prev_event)
+            # Keep the allocator from recycling the side-stream allocation early
+            prev_batch.record_stream(torch.cuda.current_stream())
+            yield prev_batch
+        prev_batch, prev_event = batch_gpu, event
+    if prev_batch is not None:
+        torch.cuda.current_stream().wait_event(prev_event)
+        prev_batch.record_stream(torch.cuda.current_stream())
+        yield prev_batch
+
+
 def evaluate_prompt_set_for_classes(
     model: CLIPModel,
     processor: CLIPProcessor,
-    class_map: Dict[str, List[Path]],
+    class_map: Dict[str, List[str]],
     prompts: List[str],
     device: str = "cuda",
-) -> Tuple[List[int], List[int]]:
+    batch_size: int = 64,
+) -> Tuple[np.ndarray, np.ndarray]:
     """
 
     Parameters
@@ -28,32 +179,57 @@ def evaluate_prompt_set_for_classes(
         A list of prompts, one per class
     device
         Inference device, default cuda
+    batch_size
+        Number of images run through the model at a time, default 64
 
     Returns
     -------
     predictions, labels
-        The predicted and actual class labels
+        ndarray [n_files] each, the predicted and actual class indices
     """
-    preds = []
-    labels = []
-    with torch.no_grad():
+    # Preallocate the outputs and fill slices, no Python int lists in between
+    total = sum(len(files) for files in class_map.values())
+    preds = np.empty(total, dtype=np.int64)
+    labels = np.empty(total, dtype=np.int64)
+    offset = 0
+    model.eval()
+    # Compile the feature paths this loop actually calls; compiling the module
+    # itself only wraps forward, which we never invoke. Default mode handles
+    # the smaller final batch with a recompile, where reduce-overhead's
+    # CUDA-graph capture doesn't mix with changing shapes or the side-stream
+    # copies in _cuda_prefetch
+    get_text_features = torch.compile(model.get_text_features)
+    get_image_features = torch.compile(model.get_image_features)
+    # inference_mode is cheaper than no_grad, and fp16 autocast roughly doubles
+    # matmul throughput on tensor cores with negligible accuracy loss
+    autocast = torch.autocast(device_type="cuda", dtype=torch.float16, enabled=device.startswith("cuda"))
+    with torch.inference_mode(), autocast:
+        # The prompts don't change per class, so run the text tower once up front
+        text_inputs = processor(text=prompts, return_tensors="pt", padding=True).to(device)
+        text_feats = get_text_features(**text_inputs)
+        text_feats = text_feats / text_feats.norm(dim=-1, keepdim=True)
+        logit_scale = model.logit_scale.exp()
         for i, (cls, files) in enumerate(class_map.items()):
-            model.eval()
-            images = [Image.open(p) for p in files]
-            inputs = processor(text=prompts, images=images, return_tensors="pt", padding=True).to(device)
-            outputs = model(**inputs)
-            logits_per_image = outputs.logits_per_image  # this is the image-text similarity score
-            probs = logits_per_image.softmax(dim=1).cpu().numpy()
-            preds.extend(list(probs.argmax(1)))
-            labels.extend(len(files) * [i])
+            loader = _make_loader(files, processor, batch_size)
+            for pixel_values in _cuda_prefetch(loader, device):
+                image_feats = get_image_features(pixel_values=pixel_values)
+                image_feats = image_feats / image_feats.norm(dim=-1, keepdim=True)
+                logits_per_image = logit_scale * image_feats @ text_feats.t()  # this is the image-text similarity score
+                # Softmax is monotonic, so argmax over the logits gives the same
+                # predictions and we only copy one int per image back to the host
+                batch_preds = logits_per_image.argmax(dim=1).cpu().numpy()
+                preds[offset:offset + len(batch_preds)] = batch_preds
+                labels[offset:offset + len(batch_preds)] = i
+                offset += len(batch_preds)
     return preds, labels
 
 
 def get_embeddings_per_class(
         model: CLIPModel,
         processor: CLIPProcessor,
-        class_map: Dict[str, List[Path]],
+        class_map: Dict[str, List[str]],
         device: str = "cuda",
+        batch_size: int = 64,
 ) -> Tuple[np.ndarray, np.ndarray]:
     """Get embeddings of all the images in a class map
 
@@ -67,6 +243,8 @@ def get_embeddings_per_class(
         A dictionary of class name to a list of file paths for the class images
     device
         Inference device, default cuda
+    batch_size
+        Number of images run through the model at a time, default 64
 
 
     Returns
@@ -76,17 +254,25 @@ def get_embeddings_per_class(
         labels is the per embedding class index
 
     """
-    embeddings = []
-    labels = []
-    with torch.no_grad():
+    # Write batches straight into preallocated arrays rather than paying the
+    # final vstack copy over the full embedding matrix
+    total = sum(len(files) for files in class_map.values())
+    embeddings = np.empty((total, model.config.projection_dim), dtype=np.float32)
+    labels = np.empty(total, dtype=np.int64)
+    offset = 0
+    # Compile get_image_features directly: compiling the module only wraps
+    # forward, which this loop never calls. Default mode so the smaller final
+    # batch just triggers a recompile instead of breaking CUDA-graph capture
+    get_image_features = torch.compile(model.get_image_features)
+    autocast = torch.autocast(device_type="cuda", dtype=torch.float16, enabled=device.startswith("cuda"))
+    with torch.inference_mode(), autocast:
         model.eval()
         for i, (cls, files) in enumerate(class_map.items()):
-            images = [Image.open(p) for p in files]
-            inputs = processor(images=images, return_tensors="pt", padding=True).to(device)
-            embedding = model.get_image_features(**inputs).cpu().numpy()
-            embeddings.append(embedding)
-            labels.append(len(files) * [i])
-    embeddings = np.vstack(embeddings)
-    labels = np.hstack(labels)
+            loader = _make_loader(files, processor, batch_size)
+            for pixel_values in _cuda_prefetch(loader, device):
+                embedding = get_image_features(pixel_values=pixel_values).float().cpu().numpy()
+                embeddings[offset:offset + len(embedding)] = embedding
+                labels[offset:offset + len(embedding)] = i
+                offset += len(embedding)
 
     return embeddings, labels